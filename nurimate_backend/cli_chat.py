@@ -1,10 +1,28 @@
 import json
 import os
+import select
 import sys
 import time
-from typing import Optional
+from typing import List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from profiling import profile_turn
+
+# One keep-alive session for the whole REPL so each turn reuses the open
+# connection instead of paying a fresh TCP/TLS handshake.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+# (connect, read): an unreachable backend fails fast, a slow LLM reply still
+# gets the full read window.
+REQUEST_TIMEOUT = (3.05, 15)
+
+# Ask the server to stream the reply; servers that can't stream just answer
+# with the usual JSON body, which is detected from the Content-Type.
+STREAM_REPLIES = os.getenv("NURIMATE_STREAM", "1") != "0"
 
 
 def main() -> None:
@@ -19,18 +37,32 @@ def main() -> None:
     print(f"Server: {chat_url}")
     print(f"Player: {player_id}\n")
 
+    try:
+        chat_loop(chat_url, server_url, player_id)
+    finally:
+        SESSION.close()
+
+
+def chat_loop(chat_url: str, server_url: str, player_id: str) -> None:
     while True:
         try:
-            user_text = input("you > ").strip()
+            # A multi-line paste arrives as several lines at once; send it as
+            # one message (one round trip) instead of one request per line.
+            lines = [input("you > ")] + read_pending_lines()
+            user_text = "\n".join(lines).strip()
             if not user_text:
                 continue
 
-            payload = {"player_id": player_id, "text": user_text}
+            payload = {"player_id": player_id, "text": user_text, "stream": STREAM_REPLIES}
             
             try:
-                resp = requests.post(chat_url, json=payload, timeout=15)
+                with profile_turn("chat_post"):
+                    resp = SESSION.post(chat_url, json=payload, stream=True, timeout=REQUEST_TIMEOUT)
+                
+                if resp.status_code == 200 and resp.headers.get("Content-Type", "").startswith("text/event-stream"):
+                    print_streamed_reply(resp)
                 
-                if resp.status_code == 200:
+                elif resp.status_code == 200:
                     data = resp.json()
                     reply = data.get("reply", "")
                     
@@ -72,6 +104,40 @@ def main() -> None:
             break
 
 
+def read_pending_lines() -> List[str]:
+    """Return lines already waiting on an interactive stdin without blocking"""
+    # select() only supports sockets on Windows, and piped stdin is read ahead
+    # into Python's buffer where select() can't see it
+    if os.name == "nt" or not sys.stdin.isatty():
+        return []
+    
+    lines = []
+    while select.select([sys.stdin], [], [], 0)[0]:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        lines.append(line.rstrip("\n"))
+    return lines
+
+
+def print_streamed_reply(resp: requests.Response) -> None:
+    """Print a Server-Sent Events reply as its text deltas arrive"""
+    resp.encoding = "utf-8"  # SSE is always UTF-8; requests would guess latin-1
+    print("nova > ", end="", flush=True)
+    # Closing on every exit path returns the connection to the session's pool
+    # even if a line fails to parse or the stream breaks mid-read
+    with resp:
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if "error" in event:
+                print(f"\n[ERROR] {event['error']}", end="")
+                break
+            print(event.get("delta") or "", end="", flush=True)
+    print("\n")
+
+
 if __name__ == "__main__":
     main()
 
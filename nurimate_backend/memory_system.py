@@ -1,63 +1,130 @@
-import json
+import atexit
+import logging
 import os
+import threading
 import time
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Any
+from itertools import islice
+from typing import Deque, Dict, List, Any, Optional, Tuple
+
+import orjson
+
+from profiling import profile_turn
+
+log = logging.getLogger(__name__)
+
+# Event types worth keeping in long-term memory
+MEMORABLE_TYPES = frozenset({
+    "close_call",
+    "victory",
+    "defeat",
+    "milestone",
+    "funny_moment",
+    "first_time",
+    "achievement"
+})
+
+# Event types highlighted in the session summary
+NOTABLE_TYPES = frozenset({"close_call", "victory", "milestone"})
+
+# Long-term memorable moments kept per player
+MAX_MEMORABLE_MOMENTS = 10
+
+# Brief long-term summaries per memorable event type
+EVENT_SUMMARIES = {
+    "close_call": "Had a close call in combat",
+    "victory": "Achieved victory together",
+    "defeat": "Faced defeat but learned from it",
+    "milestone": "Reached an important milestone",
+    "funny_moment": "Shared a funny moment",
+    "first_time": "First time experience"
+}
+
+# Serializes profile writes so concurrent saves can't interleave on the temp file
+_SAVE_LOCK = threading.Lock()
+
+# Loaded long-term memories, shared by every MemorySystem for the same player
+_LONG_TERM_CACHE: Dict[str, "LongTermMemory"] = {}
+_LONG_TERM_CACHE_LOCK = threading.Lock()
+
+# Long-term saves are batched: repeated saves for a player inside the window
+# collapse into a single write by the background writer
+SAVE_BATCH_WINDOW = 0.2  # seconds
+_PENDING_SAVES: Dict[str, "LongTermMemory"] = {}
+_PENDING_SAVES_LOCK = threading.Lock()
+_PENDING_SAVES_EVENT = threading.Event()
+_FLUSH_LOCK = threading.Lock()
+_save_writer: Optional[threading.Thread] = None
+
+
+def _tail(items: Deque[Any], n: int) -> Tuple[Any, ...]:
+    """Return the last n items of a deque as a tuple (deques don't support slicing)"""
+    return tuple(islice(items, max(0, len(items) - n), None))
+
 
 class MemorySystem:
     """Manages both short-term (session) and long-term (persistent) memory for AI character"""
     
+    __slots__ = ("player_id", "short_term", "long_term", "version", "_lock")
+    
     def __init__(self, player_id: str):
         self.player_id = player_id
         self.short_term = ShortTermMemory()
-        self.long_term = LongTermMemory(player_id)
+        self.long_term = get_long_term(player_id)
+        self.version = 0  # Bumped on every mutation so prompt text can be reused until memory changes
+        # Request threads and the server's background worker share this
+        # instance; iterating a deque while another thread appends raises
+        self._lock = threading.RLock()
     
     def add_conversation(self, role: str, message: str):
         """Add to short-term conversation history (game control)"""
-        self.short_term.add_conversation(role, message)
+        with self._lock:
+            self.short_term.add_conversation(role, message)
+            self.version += 1
     
     def add_chat_message(self, role: str, message: str):
         """Add to chat-only conversation history (separate from game control)"""
-        self.short_term.add_chat_message(role, message)
+        with self._lock:
+            self.short_term.add_chat_message(role, message)
+            self.version += 1
     
-    def get_chat_history(self) -> List[Dict[str, Any]]:
+    def get_chat_history(self) -> Tuple[Dict[str, Any], ...]:
         """Get recent chat-only conversation history"""
-        return self.short_term.get_chat_history()
+        with self._lock:
+            return self.short_term.get_chat_history()
     
     def add_game_event(self, event_type: str, details: Dict[str, Any]):
         """Add significant game event"""
-        self.short_term.add_event(event_type, details)
-        
-        # Check if event is memorable enough for long-term storage
-        if self.is_memorable(event_type, details):
-            self.long_term.add_memory(event_type, details)
+        with self._lock:
+            self.short_term.add_event(event_type, details)
+            self.version += 1
+            
+            # Check if event is memorable enough for long-term storage
+            if self.is_memorable(event_type, details):
+                self.long_term.add_memory(event_type, details)
     
     def is_memorable(self, event_type: str, details: Dict[str, Any]) -> bool:
         """Determine if event should be stored in long-term memory"""
-        memorable_types = [
-            "close_call",
-            "victory",
-            "defeat",
-            "milestone",
-            "funny_moment",
-            "first_time",
-            "achievement"
-        ]
-        return event_type in memorable_types
+        return event_type in MEMORABLE_TYPES
     
     def get_context_for_llm(self) -> Dict[str, Any]:
         """Get compressed memory context for LLM prompt"""
-        context = {
-            "short_term": self.short_term.get_summary(),
-            "long_term": self.long_term.get_relevant_memories()
-        }
+        with self._lock:
+            context = {
+                "short_term": self.short_term.get_summary(),
+                "long_term": self.long_term.get_relevant_memories(),
+                "version": self.version
+            }
         return context
     
     def update_long_term(self):
         """Update long-term memory at session end"""
-        session_summary = self.short_term.summarize_session()
-        self.long_term.integrate_session(session_summary)
-        self.long_term.save()
+        with self._lock:
+            session_summary = self.short_term.summarize_session()
+            self.long_term.integrate_session(session_summary)
+            self.long_term.schedule_save()
+            self.version += 1
     
     def compress_for_cost(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Compress context to minimize token usage"""
@@ -68,67 +135,66 @@ class MemorySystem:
 class ShortTermMemory:
     """In-session memory (cleared on restart)"""
     
+    __slots__ = (
+        "conversations",
+        "chat_conversations",
+        "game_events",
+        "max_conversations",
+        "max_events",
+        "session_start"
+    )
+    
     def __init__(self, max_conversations: int = 10, max_events: int = 10):
-        self.conversations: List[Dict[str, Any]] = []  # Game control conversations
-        self.chat_conversations: List[Dict[str, Any]] = []  # Chat-only conversations
-        self.game_events: List[Dict[str, Any]] = []
+        # Bounded ring buffers: append evicts the oldest entry in O(1)
+        self.conversations: Deque[Dict[str, Any]] = deque(maxlen=max_conversations)  # Game control conversations
+        self.chat_conversations: Deque[Dict[str, Any]] = deque(maxlen=10)  # Chat-only conversations
+        self.game_events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
         self.max_conversations = max_conversations
         self.max_events = max_events
-        self.session_start = time.time()
+        self.session_start = time.time_ns()  # integer nanoseconds
     
     def add_conversation(self, role: str, content: str):
         """Add conversation turn (game control)"""
         self.conversations.append({
             "role": role,
             "content": content,
-            "time": time.time()
+            "time_ns": time.time_ns()
         })
-        
-        # Keep only recent conversations
-        if len(self.conversations) > self.max_conversations:
-            self.conversations.pop(0)
     
     def add_chat_message(self, role: str, content: str):
         """Add chat-only message (separate from game control)"""
         self.chat_conversations.append({
             "role": role,
             "content": content,
-            "time": time.time()
+            "time_ns": time.time_ns()
         })
-        
-        # Keep only recent chat messages (last 10)
-        if len(self.chat_conversations) > 10:
-            self.chat_conversations.pop(0)
     
-    def get_chat_history(self) -> List[Dict[str, Any]]:
+    def get_chat_history(self) -> Tuple[Dict[str, Any], ...]:
         """Get recent chat-only conversations (last 6 = 3 exchanges)"""
-        return self.chat_conversations[-6:]
+        return _tail(self.chat_conversations, 6)
     
     def add_event(self, event_type: str, details: Dict[str, Any]):
         """Add game event"""
-        self.game_events.append({
-            "type": event_type,
-            "details": details,
-            "time": time.time()
-        })
-        
-        # Keep only recent events
-        if len(self.game_events) > self.max_events:
-            self.game_events.pop(0)
+        with profile_turn("add_event"):
+            self.game_events.append({
+                "type": event_type,
+                "details": details,
+                "time_ns": time.time_ns()
+            })
     
     def get_summary(self) -> Dict[str, Any]:
         """Get compressed summary for LLM (last 5 items only)"""
         return {
-            "recent_conversations": self.conversations[-5:],
-            "recent_chat_messages": self.chat_conversations[-3:],  # Include recent chat for game control awareness
-            "recent_events": self.game_events[-5:],
-            "session_duration": time.time() - self.session_start
+            "recent_conversations": _tail(self.conversations, 5),
+            "recent_chat_messages": _tail(self.chat_conversations, 3),  # Include recent chat for game control awareness
+            "recent_events": _tail(self.game_events, 5),
+            "session_duration": (time.time_ns() - self.session_start) / 1e9
         }
     
     def summarize_session(self) -> Dict[str, Any]:
         """Create session summary for long-term storage"""
         return {
-            "duration": time.time() - self.session_start,
+            "duration": (time.time_ns() - self.session_start) / 1e9,
             "conversation_count": len(self.conversations),
             "event_count": len(self.game_events),
             "notable_events": [e for e in self.game_events if self._is_notable(e)]
@@ -136,38 +202,69 @@ class ShortTermMemory:
     
     def _is_notable(self, event: Dict[str, Any]) -> bool:
         """Check if event is notable"""
-        notable_types = ["close_call", "victory", "milestone"]
-        return event.get("type") in notable_types
+        return event.get("type") in NOTABLE_TYPES
 
 
 class LongTermMemory:
     """Cross-session persistent memory"""
     
+    __slots__ = ("player_id", "file_path", "_data")
+    
     def __init__(self, player_id: str):
         self.player_id = player_id
         self.file_path = f"data/memory_{player_id}.json"
-        self.data = self.load()
+        self._data: Optional[Dict[str, Any]] = None  # Loaded on first access
+    
+    @property
+    def data(self) -> Dict[str, Any]:
+        """Player profile, read from disk the first time it's needed"""
+        if self._data is None:
+            self._data = self.load()
+        return self._data
     
     def load(self) -> Dict[str, Any]:
         """Load from JSON file"""
+        data = None
         if os.path.exists(self.file_path):
             try:
-                with open(self.file_path, 'r') as f:
-                    return json.load(f)
+                with open(self.file_path, 'rb') as f:
+                    data = orjson.loads(f.read())
             except Exception as e:
-                print(f"[Memory] Error loading: {e}")
-                return self.create_new_profile()
-        return self.create_new_profile()
+                log.error(f"[Memory] Error loading: {e}")
+        if data is None:
+            data = self.create_new_profile()
+        
+        # Kept as a bounded deque in memory, saved as a plain list
+        data["memorable_moments"] = deque(data.get("memorable_moments", []), maxlen=MAX_MEMORABLE_MOMENTS)
+        return data
     
     def save(self):
-        """Save to JSON file"""
-        try:
-            os.makedirs("data", exist_ok=True)
-            with open(self.file_path, 'w') as f:
-                json.dump(self.data, f, indent=2)
-            print(f"[Memory] Saved for player: {self.player_id}")
-        except Exception as e:
-            print(f"[Memory] Error saving: {e}")
+        """Save to JSON file (written to a temp file, then atomically swapped in)"""
+        with profile_turn("save"):
+            try:
+                os.makedirs("data", exist_ok=True)
+                payload = {**self.data, "memorable_moments": list(self.data["memorable_moments"])}
+                buf = orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+                tmp_path = self.file_path + ".tmp"
+                with _SAVE_LOCK:
+                    with open(tmp_path, 'wb') as f:
+                        f.write(buf)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.file_path)
+                log.info(f"[Memory] Saved for player: {self.player_id}")
+            except Exception as e:
+                log.error(f"[Memory] Error saving: {e}")
+    
+    def schedule_save(self):
+        """Queue a save for the background writer (coalesced per player)"""
+        global _save_writer
+        with _PENDING_SAVES_LOCK:
+            _PENDING_SAVES[self.player_id] = self
+            if _save_writer is None:
+                _save_writer = threading.Thread(target=_run_save_writer, daemon=True)
+                _save_writer.start()
+        _PENDING_SAVES_EVENT.set()
     
     def create_new_profile(self) -> Dict[str, Any]:
         """Create new player profile"""
@@ -188,29 +285,20 @@ class LongTermMemory:
     
     def add_memory(self, event_type: str, details: Dict[str, Any]):
         """Add memorable moment"""
-        memory = {
-            "date": datetime.now().isoformat(),
-            "type": event_type,
-            "summary": self._summarize_event(event_type, details)
-        }
-        
-        self.data["memorable_moments"].append(memory)
-        
-        # Keep only last 10 memories to control token cost
-        if len(self.data["memorable_moments"]) > 10:
-            self.data["memorable_moments"].pop(0)
+        with profile_turn("add_memory"):
+            memory = {
+                "date": datetime.now().isoformat(),
+                "type": event_type,
+                "summary": self._summarize_event(event_type, details)
+            }
+            
+            # Deque keeps only the last MAX_MEMORABLE_MOMENTS to control token cost
+            self.data["memorable_moments"].append(memory)
     
     def _summarize_event(self, event_type: str, details: Dict[str, Any]) -> str:
         """Create brief summary of event"""
-        summaries = {
-            "close_call": "Had a close call in combat",
-            "victory": "Achieved victory together",
-            "defeat": "Faced defeat but learned from it",
-            "milestone": "Reached an important milestone",
-            "funny_moment": "Shared a funny moment",
-            "first_time": "First time experience"
-        }
-        return summaries.get(event_type, str(details))
+        # str(details) only runs for event types without a canned summary
+        return EVENT_SUMMARIES.get(event_type) or str(details)
     
     def get_relevant_memories(self) -> Dict[str, Any]:
         """Get compressed relevant memories for LLM"""
@@ -218,7 +306,7 @@ class LongTermMemory:
             "player_name": self.data["player_name"],
             "playstyle": self.data["playstyle"],
             "relationship_level": self.data["relationship_level"],
-            "last_3_memories": self.data["memorable_moments"][-3:],
+            "last_3_memories": _tail(self.data["memorable_moments"], 3),
             "player_preferences": self.data["preferences"],
             "sessions_count": self.data["sessions_count"]
         }
@@ -247,5 +335,37 @@ class LongTermMemory:
             self.data["playstyle"] = "tactical"
 
 
+def get_long_term(player_id: str) -> LongTermMemory:
+    """Get the cached long-term memory for a player, loading it on first use"""
+    with _LONG_TERM_CACHE_LOCK:
+        long_term = _LONG_TERM_CACHE.get(player_id)
+        if long_term is None:
+            long_term = LongTermMemory(player_id)
+            _LONG_TERM_CACHE[player_id] = long_term
+        return long_term
+
+
+def _take_pending_saves() -> List[LongTermMemory]:
+    with _PENDING_SAVES_LOCK:
+        pending = list(_PENDING_SAVES.values())
+        _PENDING_SAVES.clear()
+    return pending
+
+
+def _run_save_writer():
+    """Background writer: wait for saves, let a burst accumulate, write each player once"""
+    while True:
+        _PENDING_SAVES_EVENT.wait()
+        time.sleep(SAVE_BATCH_WINDOW)
+        _PENDING_SAVES_EVENT.clear()
+        with _FLUSH_LOCK:
+            for long_term in _take_pending_saves():
+                long_term.save()
 
 
+@atexit.register
+def flush_pending_saves():
+    """Write any queued saves now (also runs at interpreter exit)"""
+    with _FLUSH_LOCK:
+        for long_term in _take_pending_saves():
+            long_term.save()
@@ -1,5 +1,8 @@
+import logging
 from typing import Dict, Any, Optional
 
+log = logging.getLogger(__name__)
+
 # Premade personality presets for prototype
 PERSONALITY_PRESETS = {
     "nova": {
@@ -52,10 +55,41 @@ PERSONALITY_PRESETS = {
     }
 }
 
+# Greeting templates keyed by preset name
+_GREETINGS = {
+    "nova": "Hey! I'm {name}. Ready to work together. What's the plan?",
+    "aggressive": "{name} here. Let's move fast and hit hard!"
+}
+
+# Situations that trigger initiative per initiative level (None = any situation)
+_INITIATIVE_SITUATIONS = {
+    "very_proactive": None,
+    "proactive": frozenset({"player_idle", "opportunity", "danger"})
+}
+_DEFAULT_INITIATIVE_SITUATIONS = frozenset({"danger"})
+
+# Risk assessment per risk tolerance: (assessment by risk level, default)
+_RISK_ASSESSMENTS = {
+    "high": ({"high": "acceptable"}, "low"),
+    "medium": ({"high": "risky", "medium": "acceptable"}, "safe")
+}
+_LOW_TOLERANCE_ASSESSMENT = ({"high": "too_risky", "medium": "too_risky"}, "acceptable")
+
 
 class Personality:
     """Manages AI character personality and behavior style"""
     
+    __slots__ = (
+        "preset_key",
+        "preset",
+        "name",
+        "custom_instructions",
+        "_initiative_level",
+        "_risk_tolerance",
+        "_preferred_distance",
+        "_system_prompt_addition"
+    )
+    
     def __init__(
         self,
         preset_name: str = "nova",
@@ -63,16 +97,29 @@ class Personality:
         custom_instructions: Optional[str] = None
     ):
         if preset_name not in PERSONALITY_PRESETS:
-            print(f"[Personality] Unknown preset '{preset_name}', using 'nova'")
+            log.warning(f"[Personality] Unknown preset '{preset_name}', using 'nova'")
             preset_name = "nova"
         
+        self.preset_key = preset_name
         self.preset = PERSONALITY_PRESETS[preset_name]
         self.name = custom_name if custom_name else self.preset["name"]
         self.custom_instructions = custom_instructions
-    
-    def get_system_prompt_addition(self) -> str:
-        """Generate personality section for system prompt"""
         
+        # Presets don't change after init, so read behavior settings once
+        behavior = self.preset["behavior"]
+        self._initiative_level = behavior["initiative_level"]
+        self._risk_tolerance = behavior["risk_tolerance"]
+        self._preferred_distance = behavior["preferred_distance"]
+        self._system_prompt_addition: Optional[str] = None
+    
+    @property
+    def system_prompt_addition(self) -> str:
+        """Personality section for system prompt (built once per instance)"""
+        if self._system_prompt_addition is None:
+            self._system_prompt_addition = self._build_system_prompt_addition()
+        return self._system_prompt_addition
+    
+    def _build_system_prompt_addition(self) -> str:
         prompt = f"""
 === PERSONALITY: {self.name} ===
 Brief military-style comms + casual friendliness.
@@ -87,44 +134,18 @@ Loyal, cautious, observant. Always has player's back.
     
     def get_greeting(self) -> str:
         """Get personality-appropriate greeting"""
-        greetings = {
-            "nova": f"Hey! I'm {self.name}. Ready to work together. What's the plan?",
-            "aggressive": f"{self.name} here. Let's move fast and hit hard!"
-        }
-        
-        preset_key = [k for k, v in PERSONALITY_PRESETS.items() 
-                      if v["name"] == self.preset["name"]][0]
-        return greetings.get(preset_key, f"I'm {self.name}. Ready when you are!")
+        template = _GREETINGS.get(self.preset_key, "I'm {name}. Ready when you are!")
+        return template.format(name=self.name)
     
     def should_take_initiative(self, situation: str) -> bool:
         """Determine if personality should take initiative in situation"""
-        initiative_level = self.preset['behavior']['initiative_level']
-        
-        if initiative_level == "very_proactive":
-            return True
-        elif initiative_level == "proactive":
-            return situation in ["player_idle", "opportunity", "danger"]
-        else:
-            return situation in ["danger"]
+        situations = _INITIATIVE_SITUATIONS.get(self._initiative_level, _DEFAULT_INITIATIVE_SITUATIONS)
+        return situations is None or situation in situations
     
     def get_risk_assessment(self, risk_level: str) -> str:
         """Get personality-appropriate risk assessment"""
-        tolerance = self.preset['behavior']['risk_tolerance']
-        
-        if tolerance == "high":
-            if risk_level == "high":
-                return "acceptable"
-            return "low"
-        elif tolerance == "medium":
-            if risk_level == "high":
-                return "risky"
-            elif risk_level == "medium":
-                return "acceptable"
-            return "safe"
-        else:  # low tolerance
-            if risk_level in ["high", "medium"]:
-                return "too_risky"
-            return "acceptable"
+        assessments, default = _RISK_ASSESSMENTS.get(self._risk_tolerance, _LOW_TOLERANCE_ASSESSMENT)
+        return assessments.get(risk_level, default)
 
 
 
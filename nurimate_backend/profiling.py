@@ -0,0 +1,36 @@
+"""Opt-in timing probes for backend hot paths.
+
+Where the time goes: nothing in the backend is compute-bound. A turn is
+dominated by network I/O (the OpenAI call, the CLI -> server hop), then by
+allocation and serialization (memory buffers, JSON encode/decode), then by
+disk writes of long-term memory. Optimizations should follow that order:
+connection reuse / streaming, data structures, serialization, caching and
+batching.
+
+Set NURIMATE_PROFILE=1 to print per-call timings to stderr, e.g.
+    [prof] add_event 4.2us
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+PROFILE = os.environ.get("NURIMATE_PROFILE") == "1"
+
+_DISABLED = nullcontext()
+
+
+def profile_turn(name: str):
+    """Time the enclosed block when profiling is enabled (no-op otherwise)"""
+    return _timed(name) if PROFILE else _DISABLED
+
+
+@contextmanager
+def _timed(name: str):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        elapsed_us = (time.perf_counter_ns() - start) / 1e3
+        print(f"[prof] {name} {elapsed_us:.1f}us", file=sys.stderr)
@@ -1,28 +1,149 @@
-import json
+import atexit
+import hashlib
+import logging
+import logging.handlers
 import os
+import queue
+import re
+import sys
+import threading
 import uuid
 import time
-from flask import Flask, request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+import msgpack
+import orjson
+from flask import Flask, Response, request, stream_with_context
 from flask_sock import Sock
 from openai import OpenAI
 from dotenv import load_dotenv
 
-from memory_system import MemorySystem
+from memory_system import MemorySystem, flush_pending_saves
 from personality import Personality
 
 # Load environment variables
 load_dotenv()
 
-# Global perception state for chat context
-last_perception_data = {"text": "", "timestamp": 0}
-
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Logging goes through a queue: request threads only enqueue records and a
+# background listener thread does the actual stdout writes
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+log_queue = queue.Queue(-1)
+logging.basicConfig(level=LOG_LEVEL, format="%(message)s", handlers=[logging.handlers.QueueHandler(log_queue)])
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+log_listener.start()
+# httpx logs every request at INFO; keep only its warnings
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+@atexit.register
+def stop_logging():
+    """Flush queued memory saves, then stop the listener so their log lines still print"""
+    # memory_system's own exit hook was registered first and so would run
+    # after the listener has already stopped
+    flush_pending_saves()
+    log_listener.stop()
+
+
+log = logging.getLogger("nurimate.server")
+
+# Latest text perception per player for chat context: player_id -> (text, timestamp).
+# Keyed by the server's PLAYER_ID, like `memory`, until memory is per-player too.
+# Anything older than the TTL is treated as missing rather than shown as stale.
+PERCEPTION_TTL = 30  # seconds
+last_perceptions = {}
+last_perceptions_lock = threading.Lock()
+
+# Initialize OpenAI client on a long-lived HTTP/2 connection pool so
+# back-to-back /perceive calls reuse the TLS connection instead of
+# handshaking again (httpx's default keep-alive expiry is only 5s)
+http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60.0),
+    timeout=30.0
+)
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+
+# Perception commands are short constrained JSON, so they can be routed to a
+# cheaper model than /chat, optionally on another OpenAI-compatible server
+# (e.g. a local llama.cpp server at http://localhost:8000/v1)
+PERCEPTION_MODEL = os.getenv("PERCEPTION_MODEL", "gpt-4o-mini")
+PERCEPTION_BASE_URL = os.getenv("PERCEPTION_BASE_URL")
+if PERCEPTION_BASE_URL:
+    perception_client = OpenAI(
+        api_key=os.getenv("PERCEPTION_API_KEY") or os.getenv("OPENAI_API_KEY"),
+        base_url=PERCEPTION_BASE_URL,
+        http_client=http_client
+    )
+else:
+    perception_client = client
+
+# Structured Outputs schema for text-perception replies (mirrors BehaviorCommand.cs
+# in Unity); the model can only produce JSON of this shape
+BEHAVIOR_COMMAND_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "behavior_command",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "type": {"type": "string", "enum": ["behavior"]},
+                "behavior": {
+                    "type": "string",
+                    "enum": ["follow_player", "move_to", "take_cover", "hold_position"]
+                },
+                "target": {"type": ["string", "null"]},
+                "duration": {"type": ["number", "null"]},
+                "context": {
+                    "type": ["object", "null"],
+                    "properties": {
+                        "urgency": {"type": ["string", "null"]},
+                        "threat_direction": {"type": ["string", "null"]}
+                    },
+                    "required": ["urgency", "threat_direction"],
+                    "additionalProperties": False
+                }
+            },
+            "required": ["type", "behavior", "target", "duration", "context"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Routine text perceptions (player in view, no threats, no recent player
+# orders) get the prompt's default behavior without an OpenAI call
+PLAYER_VISIBLE_PATTERN = re.compile(r"^Player: \d+m ", re.MULTILINE)
+NO_THREATS_PATTERN = re.compile(r"^Threats: None visible\.", re.MULTILINE)
+ROUTINE_COMMAND = {"type": "behavior", "behavior": "follow_player", "duration": 10}
+perception_stats = {"total": 0, "fast_path": 0}
+perception_stats_lock = threading.Lock()
+
+# Game-control response cache: an identical prompt (e.g. a stationary scene
+# re-sent by Unity) reuses the previous command instead of calling OpenAI
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 300  # seconds
+response_cache = OrderedDict()  # prompt hash -> (expires_at, content)
+response_cache_lock = threading.Lock()
+inflight_completions = {}  # prompt hash -> Future for a call already in progress
+
+# Housekeeping that the reply doesn't depend on (event detection, cost and
+# action logs) runs here after the command is returned. A single worker
+# keeps the jobs in submission order.
+background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="post-process")
+
+# Last formatted memory block as (memory version, text)
+last_memory_text = (None, "")
 
 # Initialize Flask and WebSocket
 app = Flask(__name__)
 sock = Sock(app)
 
+# Perception and chat bodies are a few KB; refuse anything far larger before
+# it is buffered and parsed (Werkzeug raises 413 while reading the body)
+app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024
+
 # Configuration
 PLAYER_ID = os.getenv("PLAYER_ID", "demo_player")
 PORT = int(os.getenv("PORT", 8080))
@@ -42,23 +163,39 @@ with open("prompts/chat_prompt.txt", 'r') as f:
 with open("prompts/perception_prompt.txt", 'r') as f:
     PERCEPTION_PROMPT = f.read()
 
-print(f"[Server] Initializing NuriMate AI Backend")
-print(f"[Server] Player ID: {PLAYER_ID}")
-print(f"[Server] Personality: {personality.name}")
-print(f"[Server] Base prompt loaded: {len(BASE_SYSTEM_PROMPT)} chars")
-print(f"[Server] Chat prompt loaded: {len(CHAT_SYSTEM_PROMPT)} chars")
-print(f"[Server] Perception prompt loaded: {len(PERCEPTION_PROMPT)} chars (optimized)")
+# Static system messages, assembled once since the personality is fixed for
+# the server's lifetime (also keeps the cacheable prefix byte-identical)
+GAME_SYSTEM_MESSAGE = BASE_SYSTEM_PROMPT + "\n\n" + personality.system_prompt_addition
+CHAT_SYSTEM_MESSAGE = CHAT_SYSTEM_PROMPT + "\n\n" + personality.system_prompt_addition
+
+log.info(f"[Server] Initializing NuriMate AI Backend")
+log.info(f"[Server] Player ID: {PLAYER_ID}")
+log.info(f"[Server] Personality: {personality.name}")
+log.info(f"[Server] Base prompt loaded: {len(BASE_SYSTEM_PROMPT)} chars")
+log.info(f"[Server] Chat prompt loaded: {len(CHAT_SYSTEM_PROMPT)} chars")
+log.info(f"[Server] Perception prompt loaded: {len(PERCEPTION_PROMPT)} chars (optimized)")
+log.info(f"[Server] Perception model: {PERCEPTION_MODEL}" + (f" @ {PERCEPTION_BASE_URL}" if PERCEPTION_BASE_URL else ""))
 
 
 @sock.route('/ai')
 def ai_websocket(ws):
     """Main WebSocket endpoint for Unity connection"""
-    print(f"\n[Server] ✓ {personality.name} connected for player: {PLAYER_ID}")
+    log.info(f"\n[Server] ✓ {personality.name} connected for player: {PLAYER_ID}")
+    
+    # Clients opt into binary msgpack frames with ws://.../ai?proto=msgpack;
+    # plain JSON text frames stay the default
+    use_msgpack = request.args.get("proto") == "msgpack"
+    if use_msgpack:
+        log.info(f"[Server] Using msgpack frames")
     
     # Session start - load long-term memory
     memory_context = memory.get_context_for_llm()
-    print(f"[Memory] Loaded {len(memory_context['long_term']['last_3_memories'])} memories")
-    print(f"[Memory] Relationship level: {memory_context['long_term']['relationship_level']}/10")
+    log.info(f"[Memory] Loaded {len(memory_context['long_term']['last_3_memories'])} memories")
+    log.info(f"[Memory] Relationship level: {memory_context['long_term']['relationship_level']}/10")
+    
+    # Prime OpenAI's prompt cache with the static system prefix while Unity
+    # assembles its first snapshot, so the first real call gets a cache hit
+    threading.Thread(target=warm_prompt_cache, args=(GAME_SYSTEM_MESSAGE,), daemon=True).start()
     
     message_count = 0
     
@@ -72,95 +209,76 @@ def ai_websocket(ws):
             message_count += 1
             
             try:
-                data = json.loads(message)
+                data = msgpack.unpackb(message, raw=False) if use_msgpack else orjson.loads(message)
                 
                 # Handle different message types
                 if data.get('type') == 'state_snapshot':
-                    print(f"\n[{message_count}] Received perception snapshot")
+                    log.info(f"\n[{message_count}] Received perception snapshot")
                     
                     # Process with memory and personality
                     response = process_with_memory(data, memory_context)
                     
                     # Send command back to Unity
-                    ws.send(json.dumps(response))
-                    print(f"[{message_count}] ✓ Sent command to Unity")
+                    if use_msgpack:
+                        ws.send(msgpack.packb(response, use_bin_type=True))
+                    else:
+                        ws.send(orjson.dumps(response).decode())
+                    log.info(f"[{message_count}] ✓ Sent command to Unity")
                     
                 else:
-                    print(f"[Warning] Unknown message type: {data.get('type')}")
+                    log.warning(f"[Warning] Unknown message type: {data.get('type')}")
                     
-            except json.JSONDecodeError as e:
-                print(f"[Error] JSON decode error: {e}")
+            except ValueError as e:
+                # orjson and msgpack decode errors both subclass ValueError
+                log.error(f"[Error] Frame decode error: {e}")
             except Exception as e:
-                print(f"[Error] Processing error: {e}")
+                log.error(f"[Error] Processing error: {e}")
                 
     except Exception as e:
-        print(f"[Error] WebSocket error: {e}")
+        log.error(f"[Error] WebSocket error: {e}")
     finally:
         # Session end - save memories
-        print(f"\n[Server] Session ending...")
+        log.info(f"\n[Server] Session ending...")
         memory.update_long_term()
-        print(f"[Server] ✓ Memories saved")
-        print(f"[Server] ✗ {personality.name} disconnected\n")
+        log.info(f"[Server] ✓ Memories queued for save")
+        log.info(f"[Server] ✗ {personality.name} disconnected\n")
 
 
 def process_with_memory(perception, memory_context):
     """Process perception with personality and memory"""
     
-    # Build full prompt
-    full_prompt = build_full_prompt(perception, memory_context)
-    
     try:
+        # Serialize the snapshot once; it's reused for the prompt and for memory.
+        # A msgpack frame can carry bytes keys/values orjson rejects, so this
+        # stays inside the try and such a snapshot still gets the fallback.
+        perception_json = orjson.dumps(perception).decode()
+        
+        # Build full prompt
+        full_prompt = build_full_prompt(perception_json, memory_context)
+        
         # Call OpenAI
-        print(f"[OpenAI] Calling gpt-4o-mini...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=full_prompt,
+        log.info(f"[OpenAI] Calling {PERCEPTION_MODEL}...")
+        command_text, usage = cached_completion(
+            full_prompt,
+            api=perception_client,
+            model=PERCEPTION_MODEL,
             max_completion_tokens=200,
             response_format={"type": "json_object"}
         )
         
-        # Extract command
-        command_text = response.choices[0].message.content
-        
-        # DEBUG: Log raw response
-        print(f"[DEBUG] Raw game control response (first 500 chars): {repr(command_text[:500] if command_text else 'None')}")
-        print(f"[DEBUG] Response length: {len(command_text) if command_text else 0} chars")
-        
-        # Try to parse JSON
-        try:
-            command = json.loads(command_text)
-        except json.JSONDecodeError as e:
-            print(f"[DEBUG] JSON parse failed at position {e.pos}")
-            print(f"[DEBUG] Full response: {repr(command_text)}")
-            raise
-        
-        # Ensure command has required fields
-        if "type" not in command:
-            command["type"] = "command"
-        if "id" not in command:
-            command["id"] = str(uuid.uuid4())
+        command = parse_command_json(command_text, fallback_type="command")
         
         # Update short-term memory
-        memory.add_conversation("user", json.dumps(perception))
+        memory.add_conversation("user", perception_json)
         memory.add_conversation("assistant", command_text)
         
-        # Check for significant events in perception
-        check_for_events(perception)
-        
-        # Log cost
-        usage = response.usage
-        cost = calculate_cost(usage)
-        print(f"[Cost] ${cost:.6f} | Tokens: {usage.total_tokens} (in:{usage.prompt_tokens} out:{usage.completion_tokens})")
-        
-        # Log action summary
-        if "plan" in command and "sequence" in command["plan"]:
-            actions = [step.get("action", "unknown") for step in command["plan"]["sequence"]]
-            print(f"[Action] {personality.name} → {' → '.join(actions)}")
+        # Event detection and logging happen off the request path
+        background.submit(post_process, command, usage, perception)
         
         return command
         
     except Exception as e:
-        print(f"[Error] OpenAI API error: {e}")
+        log.error(f"[Error] OpenAI API error: {e}")
         # Return fallback command
         return create_fallback_command()
 
@@ -168,46 +286,84 @@ def process_with_memory(perception, memory_context):
 def process_text_perception(perception_text, memory_context):
     """Process TEXT-BASED perception (NEW SYSTEM)"""
     
+    # Skip the model entirely when the rules in the perception prompt already
+    # decide the answer
+    routine_command = match_routine_perception(perception_text, memory_context)
+    with perception_stats_lock:
+        perception_stats["total"] += 1
+        if routine_command is not None:
+            perception_stats["fast_path"] += 1
+        fast_path, total = perception_stats["fast_path"], perception_stats["total"]
+    if routine_command is not None:
+        memory.add_conversation("user", perception_text)
+        memory.add_conversation("assistant", orjson.dumps(routine_command).decode())
+        log.info(f"[FastPath] {personality.name} → {routine_command['behavior']} "
+                 f"({fast_path}/{total} perceptions)")
+        return routine_command
+    
     # Build full prompt with text perception
     full_prompt = build_text_prompt(perception_text, memory_context)
     
     try:
         # Call OpenAI
-        print(f"[OpenAI] Calling gpt-4o-mini with TEXT perception...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=full_prompt,
+        log.info(f"[OpenAI] Calling {PERCEPTION_MODEL} with TEXT perception...")
+        command_text, usage = cached_completion(
+            full_prompt,
+            api=perception_client,
+            model=PERCEPTION_MODEL,
             max_completion_tokens=200,
-            response_format={"type": "json_object"}
+            response_format=BEHAVIOR_COMMAND_FORMAT
         )
         
-        # Extract command
-        command_text = response.choices[0].message.content
-        
-        # DEBUG: Log raw response
-        print(f"[DEBUG] Raw response (first 300 chars): {repr(command_text[:300] if command_text else 'None')}")
-        
-        # Parse JSON
-        try:
-            command = json.loads(command_text)
-        except json.JSONDecodeError as e:
-            print(f"[DEBUG] JSON parse failed: {e}")
-            print(f"[DEBUG] Full response: {repr(command_text)}")
-            raise
-        
-        # Ensure command has required fields
-        if "type" not in command:
-            # Default to behavior type for new system
-            command["type"] = "behavior"
+        # Structured Outputs guarantees schema-valid JSON here
+        command = parse_command_json(command_text, fallback_type="behavior")
         
         # Update short-term memory
         memory.add_conversation("user", perception_text)
         memory.add_conversation("assistant", command_text)
         
-        # Log cost
-        usage = response.usage
-        cost = calculate_cost(usage)
-        print(f"[Cost] ${cost:.6f} | Tokens: {usage.total_tokens} (in:{usage.prompt_tokens} out:{usage.completion_tokens})")
+        # Cost and action logging happen off the request path
+        background.submit(post_process, command, usage)
+        
+        return command
+        
+    except Exception as e:
+        log.error(f"[Error] OpenAI API error: {e}")
+        import traceback
+        log.error(traceback.format_exc())
+        return create_fallback_command()
+
+
+def warm_prompt_cache(system_message):
+    """Send a 1-token request so the system prompt prefix lands in OpenAI's prompt cache"""
+    try:
+        # Prompt caches are per model, so warm the one perceptions go to
+        perception_client.chat.completions.create(
+            model=PERCEPTION_MODEL,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": "ping"}
+            ],
+            max_completion_tokens=1
+        )
+        log.debug(f"[Cache] Warmed prompt cache")
+    except Exception as e:
+        # Best effort: the first real call simply pays the full prefill
+        log.warning(f"[Warning] Prompt cache warm-up failed: {e}")
+
+
+def post_process(command, usage, perception=None):
+    """Record events and log cost/action for a command that was already returned"""
+    try:
+        # Check for significant events in perception
+        if perception is not None:
+            check_for_events(perception)
+        
+        # Log cost (nothing was spent on a cache hit)
+        if usage:
+            log_usage(usage)
+        else:
+            log.info(f"[Cache] Reused cached command")
         
         # Log action summary
         if command.get("type") == "behavior":
@@ -215,19 +371,93 @@ def process_text_perception(perception_text, memory_context):
             behavior = command.get("behavior", "unknown")
             target = command.get("target", "")
             target_str = f" → {target}" if target else ""
-            print(f"[Behavior] {personality.name} → {behavior}{target_str}")
+            log.info(f"[Behavior] {personality.name} → {behavior}{target_str}")
         elif "plan" in command and "sequence" in command["plan"]:
             # Legacy command system
             actions = [step.get("action", "unknown") for step in command["plan"]["sequence"]]
-            print(f"[Action] {personality.name} → {' → '.join(actions)}")
-        
-        return command
+            log.info(f"[Action] {personality.name} → {' → '.join(actions)}")
+    except Exception as e:
+        # Nobody waits on the future, so an exception would vanish silently
+        log.error(f"[Error] Post-processing failed: {e}")
+
+
+def parse_command_json(raw, *, fallback_type):
+    """Parse a model command and fill in the fields Unity relies on.
+    Null fields are dropped so Unity's JsonUtility keeps its defaults.
+    """
+    # DEBUG: Log raw response
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"[DEBUG] Raw command response (first 500 chars): {repr(raw[:500] if raw else 'None')}")
+        log.debug(f"[DEBUG] Response length: {len(raw) if raw else 0} chars")
+    
+    try:
+        command = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        log.debug(f"[DEBUG] JSON parse failed at position {e.pos}")
+        log.debug(f"[DEBUG] Full response: {repr(raw)}")
+        raise
+    
+    command = {k: v for k, v in command.items() if v is not None}
+    command.setdefault("type", fallback_type)
+    command.setdefault("id", str(uuid.uuid4()))
+    return command
+
+
+def match_routine_perception(perception_text, memory_context):
+    """Return the default command for a routine perception, or None if the model is needed"""
+    # Same window build_text_prompt shows the model as RECENT PLAYER COMMANDS
+    recent_chat = memory_context["short_term"].get("recent_chat_messages", [])
+    if any(msg.get("role") == "user" for msg in recent_chat[-2:]):
+        return None
+    
+    if PLAYER_VISIBLE_PATTERN.search(perception_text) and NO_THREATS_PATTERN.search(perception_text):
+        return dict(ROUTINE_COMMAND, id=str(uuid.uuid4()))
+    return None
+
+
+def cached_completion(messages, *, api=client, **kwargs):
+    """Run a chat completion on `api`, reusing the result of an identical recent or in-flight request.
+    Returns (content, usage); usage is None when no new API call was made.
+    """
+    key = hashlib.blake2b(
+        orjson.dumps([messages, kwargs], option=orjson.OPT_SORT_KEYS), digest_size=16
+    ).hexdigest()
+    now = time.time()
+    
+    with response_cache_lock:
+        entry = response_cache.get(key)
+        if entry and entry[0] > now:
+            response_cache.move_to_end(key)
+            return entry[1], None
         
+        # Identical request already on its way to OpenAI: wait for its answer
+        # instead of paying for a second call
+        pending = inflight_completions.get(key)
+        if pending is None:
+            inflight_completions[key] = future = Future()
+    
+    if pending is not None:
+        return pending.result(), None
+    
+    try:
+        response = api.chat.completions.create(messages=messages, **kwargs)
+        content = response.choices[0].message.content
     except Exception as e:
-        print(f"[Error] OpenAI API error: {e}")
-        import traceback
-        print(traceback.format_exc())
-        return create_fallback_command()
+        with response_cache_lock:
+            inflight_completions.pop(key, None)
+        future.set_exception(e)
+        raise
+    
+    with response_cache_lock:
+        inflight_completions.pop(key, None)
+        if content:
+            response_cache[key] = (now + RESPONSE_CACHE_TTL, content)
+            response_cache.move_to_end(key)
+            while len(response_cache) > RESPONSE_CACHE_SIZE:
+                response_cache.popitem(last=False)
+    
+    future.set_result(content)
+    return content, response.usage
 
 
 def build_text_prompt(perception_text, memory_context):
@@ -235,21 +465,20 @@ def build_text_prompt(perception_text, memory_context):
     
     # Use LIGHTWEIGHT perception prompt (not full BASE_SYSTEM_PROMPT!)
     # This cuts token usage from 1,300 → ~150
-    system_message = PERCEPTION_PROMPT
+    # Static prompt goes first, unchanged, so OpenAI can reuse the cached prefix
+    messages = [
+        {"role": "system", "content": PERCEPTION_PROMPT}
+    ]
     
     # Add ONLY recent player chat commands (if any)
     # This allows AI to follow player orders from chat
     recent_chat = memory_context["short_term"].get("recent_chat_messages", [])
     if recent_chat:
-        chat_summary = "\n\nRECENT PLAYER COMMANDS:\n"
+        chat_summary = "RECENT PLAYER COMMANDS:\n"
         for msg in recent_chat[-2:]:  # Last 2 chat messages only
             if msg.get("role") == "user":
                 chat_summary += f"- {msg.get('content', '')}\n"
-        system_message += chat_summary
-    
-    messages = [
-        {"role": "system", "content": system_message}
-    ]
+        messages.append({"role": "system", "content": chat_summary})
     
     # NO conversation history for perception updates!
     # Each perception is stateless - AI evaluates current situation only
@@ -263,36 +492,46 @@ def build_text_prompt(perception_text, memory_context):
     return messages
 
 
-def build_full_prompt(perception, memory_context):
+def build_full_prompt(perception_json, memory_context):
     """Build complete prompt with personality + memory + perception (LEGACY JSON)"""
     
-    # Build system message
-    system_message = BASE_SYSTEM_PROMPT + "\n\n"
-    system_message += personality.get_system_prompt_addition() + "\n\n"
-    system_message += format_memory_context(memory_context)
-    
+    # Only the static prompt + personality go in the system message, so the
+    # prefix is identical on every call and stays cacheable
     messages = [
-        {"role": "system", "content": system_message}
+        {"role": "system", "content": GAME_SYSTEM_MESSAGE}
     ]
     
     # Add recent conversation history (short-term memory)
     recent_convos = memory_context["short_term"].get("recent_conversations", [])
-    for convo in recent_convos[-6:]:  # Last 3 exchanges
+    for convo in recent_convos[-4:]:  # Last 2 exchanges
         messages.append({
             "role": convo["role"],
             "content": convo["content"]
         })
     
-    # Add current perception
+    # Session-dependent memory rides along with the current perception at the end
     messages.append({
         "role": "user",
-        "content": json.dumps(perception)
+        "content": format_memory_context(memory_context) + "\n\n---\n\n" + perception_json
     })
     
     return messages
 
 
 def format_memory_context(memory_context):
+    """Format memory for prompt, reusing the last result while memory is unchanged"""
+    global last_memory_text
+    version = memory_context.get("version")
+    cached_version, cached_text = last_memory_text
+    if version is not None and version == cached_version:
+        return cached_text
+    
+    text = render_memory_context(memory_context)
+    last_memory_text = (version, text)
+    return text
+
+
+def render_memory_context(memory_context):
     """Format memory for prompt (compressed)"""
     short = memory_context["short_term"]
     long = memory_context["long_term"]
@@ -307,9 +546,8 @@ def format_memory_context(memory_context):
     # Format recent events
     events_text = ""
     for event in short.get("recent_events", [])[-3:]:
-        events_text += f"- {event.get('type')}: {event.get('details', {})}\n"
-    if not events_text:
-        events_text = "- No recent events\n"
+        # OPT_SORT_KEYS keeps the text byte-identical for identical details
+        events_text += f"- {event.get('type')}: {orjson.dumps(event.get('details', {}), option=orjson.OPT_SORT_KEYS).decode()}\n"
     
     # Format memories
     memories_text = ""
@@ -318,31 +556,27 @@ def format_memory_context(memory_context):
     if not memories_text:
         memories_text = "- First time playing together\n"
     
-    # Format preferences
-    prefs = long.get("player_preferences", {})
-    likes = ", ".join(prefs.get("likes", [])[:3]) or "Unknown"
+    # One compact player line; fields with nothing to say are left out
+    player_fields = [f"Player: {long.get('player_name', 'Player')}"]
+    playstyle = long.get("playstyle", "unknown")
+    if playstyle and playstyle != "unknown":
+        player_fields.append(f"playstyle {playstyle}")
+    player_fields.append(f"relationship {long.get('relationship_level', 1)}/10")
+    if long.get("sessions_count"):
+        player_fields.append(f"sessions {long['sessions_count']}")
+    likes = ", ".join(long.get("player_preferences", {}).get("likes", [])[:3])
+    if likes:
+        player_fields.append(f"likes {likes}")
     
-    # Build context with chat messages if present
-    chat_section = f"""
-Recent Chat:
-{chat_text}
-""" if chat_text else ""
+    # Build context with chat messages / events only if present
+    chat_section = f"Recent Chat:\n{chat_text}\n" if chat_text else ""
+    events_section = f"Recent Events:\n{events_text}\n" if events_text else ""
     
-    context = f"""
-MEMORY CONTEXT:
-{chat_section}
-Recent Events:
-{events_text}
-
-About Player ({long.get("player_name", "Player")}):
-- Playstyle: {long.get("playstyle", "unknown")}
-- Relationship: Level {long.get("relationship_level", 1)}/10
-- Sessions played: {long.get("sessions_count", 0)}
-- Likes: {likes}
+    context = f"""MEMORY CONTEXT:
+{chat_section}{events_section}{" | ".join(player_fields)}
 
 Recent Shared Memories:
-{memories_text}
-"""
+{memories_text}"""
     return context
 
 
@@ -375,6 +609,14 @@ def calculate_cost(usage):
     return input_cost + output_cost
 
 
+def log_usage(usage):
+    """Log token usage and cost (cached = prompt tokens served from OpenAI's prefix cache)"""
+    cost = calculate_cost(usage)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    log.info(f"[Cost] ${cost:.6f} | Tokens: {usage.total_tokens} (in:{usage.prompt_tokens} cached:{cached} out:{usage.completion_tokens})")
+
+
 def create_fallback_command():
     """Create safe fallback command if LLM fails"""
     return {
@@ -391,25 +633,25 @@ def create_fallback_command():
     }
 
 
-def build_chat_prompt(user_text: str, memory_context, chat_history: list, current_perception: str = ""):
+def build_chat_prompt(user_text: str, memory_context, chat_history: tuple, current_perception: str = "",
+                      perception_age: float = 0):
     """Build conversational prompt for terminal chat replies with REAL-TIME game awareness.
     Uses chat_prompt.txt which focuses on natural conversation, not game commands.
     Uses ONLY chat history (no game control JSON pollution).
     """
     # Use CHAT prompt (conversational) instead of BASE prompt (game control)
-    system_message = CHAT_SYSTEM_PROMPT + "\n\n"
-    system_message += personality.get_system_prompt_addition() + "\n\n"
-    system_message += format_memory_context(memory_context)
+    # Only static text in the system message so the prefix stays cacheable;
+    # memory and game state go with the latest user message instead
+    context_message = format_memory_context(memory_context)
     
     # Add current game situation if available
     if current_perception:
-        age = time.time() - last_perception_data.get("timestamp", 0)
-        system_message += f"\n\n=== CURRENT GAME SITUATION ===\n{current_perception}\n"
-        if age > 5:
-            system_message += f"(Data is {int(age)}s old)\n"
+        context_message += f"\n\n=== CURRENT GAME SITUATION ===\n{current_perception}\n"
+        if perception_age > 5:
+            context_message += f"(Data is {int(perception_age)}s old)\n"
 
     messages = [
-        {"role": "system", "content": system_message}
+        {"role": "system", "content": CHAT_SYSTEM_MESSAGE}
     ]
 
     # Include ONLY chat history (clean, no game control JSON)
@@ -419,11 +661,35 @@ def build_chat_prompt(user_text: str, memory_context, chat_history: list, curren
             "content": convo["content"]
         })
 
-    # Add current user message
-    messages.append({"role": "user", "content": user_text})
+    # Add current user message, prefixed with the session context
+    messages.append({
+        "role": "user",
+        "content": context_message + "\n\n---\n\nPLAYER MESSAGE:\n" + user_text
+    })
     return messages
 
 
+def remember_perception(player_id, perception_text):
+    """Store a player's latest text perception, dropping other players' expired ones"""
+    now = time.time()
+    with last_perceptions_lock:
+        for stale_id in [pid for pid, (_, ts) in last_perceptions.items() if now - ts > PERCEPTION_TTL]:
+            del last_perceptions[stale_id]
+        last_perceptions[player_id] = (perception_text, now)
+
+
+def get_last_perception(player_id):
+    """Return (text, age in seconds) of the player's latest perception, or ("", 0) if none is fresh"""
+    with last_perceptions_lock:
+        entry = last_perceptions.get(player_id)
+    if entry is None:
+        return "", 0
+    age = time.time() - entry[1]
+    if age > PERCEPTION_TTL:
+        return "", 0
+    return entry[0], age
+
+
 @app.route('/perceive', methods=['POST'])
 def perceive():
     """HTTP endpoint for perception data from Unity - accepts TEXT or JSON"""
@@ -432,13 +698,12 @@ def perceive():
         
         # NEW: Handle text-based perception
         if data.get('type') == 'text_perception':
-            print(f"\n[HTTP] Received TEXT perception")
+            log.info(f"\n[HTTP] Received TEXT perception")
             perception_text = data.get('perception', '')
-            print(f"[Perception Content]:\n{perception_text}")
+            log.debug(f"[Perception Content]:\n{perception_text}")
             
-            # Store perception globally for chat context
-            global last_perception_data
-            last_perception_data = {"text": perception_text, "timestamp": time.time()}
+            # Keep the latest perception for chat context
+            remember_perception(PLAYER_ID, perception_text)
             
             # Load memory context
             memory_context = memory.get_context_for_llm()
@@ -447,14 +712,15 @@ def perceive():
             response = process_text_perception(perception_text, memory_context)
             
             # DEBUG: Log what we're sending
-            print(f"[HTTP DEBUG] Response type: {type(response)}")
-            print(f"[HTTP DEBUG] Response content: {response}")
-            print(f"[HTTP] ✓ Sending command to Unity")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(f"[HTTP DEBUG] Response type: {type(response)}")
+                log.debug(f"[HTTP DEBUG] Response content: {response}")
+            log.info(f"[HTTP] ✓ Sending command to Unity")
             return response
         
         # LEGACY: Handle old JSON snapshots (backward compatibility)
         elif data.get('type') == 'state_snapshot':
-            print(f"\n[HTTP] Received LEGACY JSON snapshot (consider upgrading to text)")
+            log.info(f"\n[HTTP] Received LEGACY JSON snapshot (consider upgrading to text)")
             
             # Load memory context
             memory_context = memory.get_context_for_llm()
@@ -462,16 +728,16 @@ def perceive():
             # Process with memory and personality
             response = process_with_memory(data, memory_context)
             
-            print(f"[HTTP] ✓ Sending command to Unity")
+            log.info(f"[HTTP] ✓ Sending command to Unity")
             return response
         else:
-            print(f"[Warning] Unknown message type: {data.get('type')}")
+            log.warning(f"[Warning] Unknown message type: {data.get('type')}")
             return {"error": "Unknown message type"}, 400
             
     except Exception as e:
-        print(f"[Error] HTTP processing error: {e}")
+        log.error(f"[Error] HTTP processing error: {e}")
         import traceback
-        print(traceback.format_exc())
+        log.error(traceback.format_exc())
         return create_fallback_command()
 
 
@@ -486,7 +752,7 @@ def chat():
         if not text:
             return {"error": "Missing 'text' in payload"}, 400
 
-        print(f"\n[Chat] User: {text}")
+        log.info(f"\n[Chat] User: {text}")
 
         # Append user's message to CHAT memory (separate from game control)
         memory.add_chat_message("user", text)
@@ -494,12 +760,17 @@ def chat():
         # Build chat prompt using current memory context and CLEAN chat history
         memory_context = memory.get_context_for_llm()
         chat_history = memory.get_chat_history()
-        print(f"[Chat] Using {len(chat_history)} chat messages (no game JSON)")
-        messages = build_chat_prompt(text, memory_context, chat_history, 
-                                      current_perception=last_perception_data.get("text", ""))
+        log.info(f"[Chat] Using {len(chat_history)} chat messages (no game JSON)")
+        perception_text, perception_age = get_last_perception(PLAYER_ID)
+        messages = build_chat_prompt(text, memory_context, chat_history,
+                                      current_perception=perception_text, perception_age=perception_age)
+
+        # Clients that ask for it get the reply token-by-token as Server-Sent Events
+        if data.get('stream'):
+            return Response(stream_with_context(stream_chat_reply(messages)), mimetype="text/event-stream")
 
         # Call OpenAI to produce a conversational reply (plain text, NOT JSON)
-        print(f"[Chat] Calling gpt-4o-mini for conversational reply...")
+        log.info(f"[Chat] Calling gpt-4o-mini for conversational reply...")
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=messages,
@@ -511,25 +782,24 @@ def chat():
         raw_reply = response.choices[0].message.content or ""
         
         # DEBUG: Log raw chat response
-        print(f"[DEBUG] Chat raw response (first 200 chars): {repr(raw_reply[:200])}")
-        print(f"[DEBUG] Chat response length: {len(raw_reply)} chars")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f"[DEBUG] Chat raw response (first 200 chars): {repr(raw_reply[:200])}")
+            log.debug(f"[DEBUG] Chat response length: {len(raw_reply)} chars")
         
         reply = raw_reply.strip()
 
         # Log usage and cost
-        usage = response.usage
-        cost = calculate_cost(usage)
-        print(f"[Cost] ${cost:.6f} | Tokens: {usage.total_tokens} (in:{usage.prompt_tokens} out:{usage.completion_tokens})")
+        log_usage(response.usage)
         
         # Debug: Log raw response if it's problematic
         if not reply and raw_reply:
-            print(f"[Warning] OpenAI returned whitespace-only response: {repr(raw_reply)}")
+            log.warning(f"[Warning] OpenAI returned whitespace-only response: {repr(raw_reply)}")
             reply = "I'm here, what do you need?"
         elif not reply:
-            print(f"[Warning] OpenAI returned completely empty response")
+            log.warning(f"[Warning] OpenAI returned completely empty response")
             reply = "I'm here, what do you need?"
         
-        print(f"[Chat] Nova: {reply}\n")
+        log.info(f"[Chat] Nova: {reply}\n")
 
         # Save assistant reply to CHAT memory (separate from game control)
         memory.add_chat_message("assistant", reply)
@@ -539,13 +809,53 @@ def chat():
     except Exception as e:
         # Log detailed error to console
         import traceback
-        print(f"\n[Error] /chat endpoint error: {e}")
-        print(traceback.format_exc())
+        log.error(f"\n[Error] /chat endpoint error: {e}")
+        log.error(traceback.format_exc())
         
         # Return error to user so they can see what went wrong
         return {"error": f"Chat failed: {str(e)}", "reply": "[Error - check server logs]"}, 500
 
 
+def stream_chat_reply(messages):
+    """Yield the chat reply as Server-Sent Events, then save it to chat memory"""
+    parts = []
+    try:
+        log.info(f"[Chat] Streaming gpt-4o-mini conversational reply...")
+        stream = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            max_completion_tokens=300,
+            stream=True,
+            stream_options={"include_usage": True}  # Usage arrives on the final chunk
+        )
+        for chunk in stream:
+            if chunk.usage:
+                log_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield f"data: {orjson.dumps({'delta': delta}).decode()}\n\n"
+    except Exception as e:
+        import traceback
+        log.error(f"\n[Error] /chat stream error: {e}")
+        log.error(traceback.format_exc())
+        yield f"data: {orjson.dumps({'error': f'Chat failed: {str(e)}'}).decode()}\n\n"
+        return
+    
+    reply = "".join(parts).strip()
+    if not reply:
+        log.warning(f"[Warning] OpenAI streamed an empty response")
+        reply = "I'm here, what do you need?"
+        yield f"data: {orjson.dumps({'delta': reply}).decode()}\n\n"
+    
+    log.info(f"[Chat] Nova: {reply}\n")
+    
+    # Save assistant reply to CHAT memory (separate from game control)
+    memory.add_chat_message("assistant", reply)
+
+
 @app.route('/')
 def index():
     """Simple status page"""
@@ -566,15 +876,17 @@ def health():
 
 
 if __name__ == '__main__':
-    print(f"\n{'='*60}")
-    print(f"  NuriMate AI Backend Server")
-    print(f"  Personality: {personality.name}")
-    print(f"  Player: {PLAYER_ID}")
-    print(f"{'='*60}\n")
-    print(f"Starting server on http://0.0.0.0:{PORT}")
-    print(f"WebSocket endpoint: ws://localhost:{PORT}/ai")
-    print(f"\nWaiting for Unity connection...\n")
+    log.info(f"\n{'='*60}")
+    log.info(f"  NuriMate AI Backend Server")
+    log.info(f"  Personality: {personality.name}")
+    log.info(f"  Player: {PLAYER_ID}")
+    log.info(f"{'='*60}\n")
+    log.info(f"Starting server on http://0.0.0.0:{PORT}")
+    log.info(f"WebSocket endpoint: ws://localhost:{PORT}/ai")
+    log.info(f"\nWaiting for Unity connection...\n")
     
     # use_reloader=False prevents Flask from double-loading and caching old code
+    # Flask already serves each request on its own thread (the default since
+    # 1.0), so shared state above is guarded by locks
     app.run(host='0.0.0.0', port=PORT, debug=DEBUG, use_reloader=False)
 